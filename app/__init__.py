@@ -1,10 +1,45 @@
-from flask import Flask
+from flask import Flask, current_app, redirect, url_for, session, render_template, flash
 from flask_sqlalchemy import SQLAlchemy
+from flask_session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import raiseload
 from datetime import timedelta
+import sqlite3
+import redis
 import os
 
 db = SQLAlchemy()
 
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Tune every new SQLite connection for concurrent reads and faster commits.
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')  # Readers don't block on writers
+    cursor.execute('PRAGMA synchronous=NORMAL')  # Safe with WAL, far fewer fsyncs
+    cursor.execute('PRAGMA cache_size=-64000')  # 64MB page cache
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA busy_timeout=5000')  # Wait instead of "database is locked"
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def add_raiseload(orm_execute_state):
+    """
+    Apply raiseload('*') to every ORM select when SQLALCHEMY_RAISELOAD is on.
+    """
+    if not current_app.config.get('SQLALCHEMY_RAISELOAD'):
+        return
+    if orm_execute_state.is_select and not orm_execute_state.is_relationship_load:
+        orm_execute_state.statement = orm_execute_state.statement.options(raiseload('*'))
+
+
 def create_app():
     """
     Application factory pattern for creating Flask app instance.
@@ -15,6 +50,21 @@ def create_app():
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///todo.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_pre_ping': True,  # Detect dropped connections before use
+        'pool_recycle': 280,  # Replace connections before server-side timeouts
+        'connect_args': {'check_same_thread': False},  # Busy timeout is set by PRAGMA
+    }
+    # Make every lazy load raise so tests catch N+1 query patterns
+    app.config['SQLALCHEMY_RAISELOAD'] = os.environ.get('SQLALCHEMY_RAISELOAD') == '1'
+    
+    # Reject request bodies (e.g. CSV imports) larger than 2MB
+    app.config['MAX_CONTENT_LENGTH'] = 2 * 1024 * 1024
+    
+    # Cache successful password checks in memory (trades a little memory for KDF CPU)
+    app.config['PASSWORD_CHECK_CACHE'] = os.environ.get('PASSWORD_CHECK_CACHE') == '1'
     
     # Session configuration
     app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)  # Session expires after 7 days
@@ -22,6 +72,12 @@ def create_app():
     app.config['SESSION_COOKIE_HTTPONLY'] = True  # Prevents JavaScript access to session cookie
     app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'  # CSRF protection
     
+    # Server-side session storage in Redis (cookie only carries the session ID)
+    app.config['SESSION_TYPE'] = 'redis'
+    app.config['SESSION_REDIS'] = redis.Redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))  # Also used by stats_cache
+    app.config['SESSION_PERMANENT'] = True
+    Session(app)
+    
     # Initialize database
     db.init_app(app)
     
@@ -32,27 +88,35 @@ def create_app():
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(task_bp, url_prefix='/tasks')
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
+    # Create database tables only when asked to (otherwise run `init-db` once)
+    if os.environ.get('AUTO_CREATE_DB') == '1':
+        with app.app_context():
+            db.create_all()
     
     # Optional: Add a root route redirect
+    # Resolve the redirect targets once instead of on every request
+    with app.test_request_context():
+        tasks_url = url_for('tasks.view_task')
+        login_url = url_for('auth.login')
+    
     @app.route('/')
     def index():
-        from flask import redirect, url_for, session
         if 'user_id' in session:
-            return redirect(url_for('tasks.view_task'))
-        return redirect(url_for('auth.login'))
+            return redirect(tasks_url)
+        return redirect(login_url)
     
     # Optional: Error handlers
     @app.errorhandler(404)
     def not_found(error):
-        from flask import render_template
         return render_template('404.html'), 404
     
+    @app.errorhandler(413)
+    def too_large(error):
+        flash('File is too large (2MB maximum)', 'danger')
+        return redirect(tasks_url)
+    
     @app.errorhandler(500)
     def internal_error(error):
-        from flask import render_template
         db.session.rollback()  # Rollback any failed database transactions
         return render_template('500.html'), 500
     
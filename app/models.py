@@ -1,6 +1,69 @@
 from app import db
+from flask import current_app
+from collections import OrderedDict
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+import threading
+import hmac
+import os
+from sqlalchemy import func
+from sqlalchemy.orm import query_expression
+from werkzeug.security import check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
+
+
+# Argon2id hasher shared by all users (~7MB memory cost)
+_ph = PasswordHasher(time_cost=2, memory_cost=7168, parallelism=1)
+
+# Verified against for unknown usernames so every failed login costs one hash
+_DUMMY_HASH = _ph.hash('dummy-password')
+
+
+def check_dummy_password(password):
+    """Spend the same hashing work as a real check; always returns False."""
+    try:
+        _ph.verify(_DUMMY_HASH, password)
+    except (VerificationError, InvalidHashError):
+        pass
+    return False
+
+
+# Optional LRU of successful verifications (enabled by PASSWORD_CHECK_CACHE).
+# Keys are (stored_hash, HMAC(password)) so raw passwords are never stored;
+# the HMAC key is random per process.
+_VERIFY_CACHE_SIZE = 1024
+_verify_cache = OrderedDict()
+_verify_cache_lock = threading.Lock()
+_verify_cache_key = os.urandom(32)
+
+
+def _verify_password(stored_hash, password):
+    """Verify a password against an Argon2 or legacy werkzeug hash."""
+    # Legacy werkzeug (scrypt) hashes are verified the old way
+    if not stored_hash.startswith('$argon2'):
+        return check_password_hash(stored_hash, password)
+    try:
+        return _ph.verify(stored_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+def _verify_password_cached(stored_hash, password):
+    """Verify a password, skipping the KDF for recently verified pairs."""
+    key = (stored_hash, hmac.new(_verify_cache_key, password.encode(), 'sha256').digest())
+    with _verify_cache_lock:
+        if key in _verify_cache:
+            _verify_cache.move_to_end(key)
+            return True
+    
+    if not _verify_password(stored_hash, password):
+        return False
+    
+    with _verify_cache_lock:
+        _verify_cache[key] = True
+        if len(_verify_cache) > _VERIFY_CACHE_SIZE:
+            _verify_cache.popitem(last=False)
+    return True
 
 
 class User(db.Model):
@@ -22,19 +85,29 @@ class User(db.Model):
     
     def set_password(self, password):
         """Hash and set the user's password."""
-        self.password = generate_password_hash(password, method='scrypt')
+        self.password = _ph.hash(password)
+        with _verify_cache_lock:
+            _verify_cache.clear()
     
     def check_password(self, password):
         """Check if the provided password matches the hashed password."""
-        return check_password_hash(self.password, password)
+        if current_app.config.get('PASSWORD_CHECK_CACHE'):
+            return _verify_password_cached(self.password, password)
+        return _verify_password(self.password, password)
+    
+    def needs_rehash(self):
+        """Check if the stored hash should be upgraded to current Argon2 parameters."""
+        if not self.password.startswith('$argon2'):
+            return True
+        return _ph.check_needs_rehash(self.password)
     
     def get_task_count(self):
         """Get the total number of tasks for this user."""
-        return len(self.tasks)
+        return db.session.query(func.count(Task.id)).filter(Task.user_id == self.id).scalar()
     
     def get_completed_task_count(self):
         """Get the number of completed tasks for this user."""
-        return sum(1 for task in self.tasks if task.status == 'Done')
+        return db.session.query(func.count(Task.id)).filter(Task.user_id == self.id, Task.status == 'Done').scalar()
 
 
 class Task(db.Model):
@@ -42,16 +115,23 @@ class Task(db.Model):
     Task model for todo items.
     """
     __tablename__ = 'task'
+    __table_args__ = (
+        # Serve per-user listings (optionally by status) newest-first from the index
+        db.Index('ix_task_user_status_created', 'user_id', 'status', 'created_at'),
+        db.Index('ix_task_user_created', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=True)
+    # Truncated description loaded by list views in place of the full text
+    description_preview = query_expression()
     status = db.Column(db.String(20), default='Pending', nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
     # Foreign key to link task to user
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
     def __repr__(self):
         return f'<Task {self.title} - {self.status}>'
@@ -80,6 +160,24 @@ class Task(db.Model):
         """Mark the task as completed."""
         self.status = 'Done'
     
+    @classmethod
+    def bulk_create(cls, user_id, rows):
+        """
+        Insert many tasks for a user with a single executemany, bypassing the
+        unit of work. The caller is responsible for committing.
+        """
+        mappings = [
+            {
+                'user_id': user_id,
+                'title': row['title'],
+                'description': row.get('description') or None,
+                'status': row.get('status') or 'Pending',
+            }
+            for row in rows
+        ]
+        db.session.bulk_insert_mappings(cls, mappings)
+        return len(mappings)
+    
     def toggle_status(self):
         """Toggle task status: Pending -> Working -> Done -> Pending."""
         if self.status == 'Pending':
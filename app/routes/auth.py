@@ -1,12 +1,37 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, g
 from functools import wraps
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload, raiseload
 from app import db
-from app.models import User
+from app.models import User, check_dummy_password
 
 
 auth_bp = Blueprint('auth', __name__)
 
+# Endpoints whose templates read user.tasks
+_EAGER_TASK_ENDPOINTS = {'auth.profile'}
+
+
+@auth_bp.before_app_request
+def load_user():
+    """
+    Load the logged-in user once per request into g.user.
+    """
+    g.user = None
+    user_id = session.get('user_id')
+    if user_id is None or request.endpoint == 'static':
+        return
+    
+    query = User.query
+    if request.endpoint in _EAGER_TASK_ENDPOINTS:
+        # Load tasks up front; any other lazy load in the template raises
+        query = query.options(selectinload(User.tasks), raiseload('*'))
+    g.user = query.get(user_id)
+    
+    # User was deleted: drop the stale session
+    if g.user is None:
+        session.clear()
+
 
 # Login required decorator
 def login_required(f):
@@ -16,7 +41,7 @@ def login_required(f):
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        if g.user is None:
             flash('Please login to access this page', 'warning')
             return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
@@ -65,16 +90,15 @@ def register():
             flash('Passwords do not match', 'danger')
             return redirect(url_for('auth.register'))
         
-        # Check if username already exists
-        existing_user = User.query.filter_by(username=username).first()
-        if existing_user:
+        # Check if username already exists (SELECT EXISTS, no row is loaded)
+        if db.session.query(User.query.filter_by(username=username).exists()).scalar():
             flash('Username already exists. Please choose a different one.', 'danger')
             return redirect(url_for('auth.register'))
         
         try:
             # Create new user with hashed password
-            hashed_password = generate_password_hash(password, method='scrypt')
-            new_user = User(username=username, password=hashed_password)
+            new_user = User(username=username)
+            new_user.set_password(password)
             
             # Add to database
             db.session.add(new_user)
@@ -83,6 +107,12 @@ def register():
             flash('Registration successful! Please login.', 'success')
             return redirect(url_for('auth.login'))
             
+        except IntegrityError:
+            # Another registration took the username after our check
+            db.session.rollback()
+            flash('Username already exists. Please choose a different one.', 'danger')
+            return redirect(url_for('auth.register'))
+            
         except Exception as e:
             db.session.rollback()
             flash('An error occurred during registration. Please try again.', 'danger')
@@ -116,7 +146,12 @@ def login():
             user = User.query.filter_by(username=username).first()
             
             # Verify user exists and password is correct
-            if user and check_password_hash(user.password, password):
+            if user and user.check_password(password):
+                # Lazily migrate legacy scrypt hashes to Argon2
+                if user.needs_rehash():
+                    user.set_password(password)
+                    db.session.commit()
+                
                 # Store user ID in session (more secure than username)
                 session['user_id'] = user.id
                 session['username'] = user.username
@@ -130,6 +165,9 @@ def login():
                     return redirect(next_page)
                 return redirect(url_for('tasks.view_task'))
             else:
+                if not user:
+                    # Keep unknown usernames indistinguishable by response time
+                    check_dummy_password(password)
                 flash('Invalid username or password', 'danger')
                 
         except Exception as e:
@@ -161,14 +199,7 @@ def profile():
     """
     Display user profile page (optional - you can add this if needed).
     """
-    user_id = session.get('user_id')
-    user = User.query.get(user_id)
-    
-    if not user:
-        flash('User not found', 'danger')
-        return redirect(url_for('auth.logout'))
-    
-    return render_template('profile.html', user=user)
+    return render_template('profile.html', user=g.user)
 
 
 # Optional: Password reset/change functionality
@@ -184,15 +215,10 @@ def change_password():
         confirm_password = request.form.get('confirm_password', '')
         
         # Get current user
-        user_id = session.get('user_id')
-        user = User.query.get(user_id)
-        
-        if not user:
-            flash('User not found', 'danger')
-            return redirect(url_for('auth.logout'))
+        user = g.user
         
         # Validate current password
-        if not check_password_hash(user.password, current_password):
+        if not user.check_password(current_password):
             flash('Current password is incorrect', 'danger')
             return redirect(url_for('auth.change_password'))
         
@@ -207,7 +233,7 @@ def change_password():
         
         try:
             # Update password
-            user.password = generate_password_hash(new_password, method='scrypt')
+            user.set_password(new_password)
             db.session.commit()
             
             flash('Password changed successfully!', 'success')
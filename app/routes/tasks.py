@@ -1,10 +1,35 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+import csv
+import io
+from sqlalchemy import select, bindparam, lambda_stmt, func
+from sqlalchemy.orm import defer, with_expression
 from app import db
 from app.models import Task
+from app.stats_cache import get_stats, invalidate_stats
 from app.routes.auth import login_required
 
 task_bp = Blueprint('tasks', __name__)
 
+MAX_IMPORT_ROWS = 1000  # Largest CSV import accepted in one request
+
+# Cached statements: SQL is compiled once and reused on every request
+_task_by_id_user = lambda_stmt(
+    lambda: select(Task).where(Task.id == bindparam('tid'), Task.user_id == bindparam('uid'))
+)
+# List views only show the first 50 characters of the description,
+# so load a short preview instead of the full TEXT column
+_tasks_by_user = lambda_stmt(
+    lambda: select(Task)
+    .options(defer(Task.description), with_expression(Task.description_preview, func.substr(Task.description, 1, 51)))
+    .where(Task.user_id == bindparam('uid')).order_by(Task.created_at.desc())
+)
+_tasks_by_user_status = lambda_stmt(
+    lambda: select(Task)
+    .options(defer(Task.description), with_expression(Task.description_preview, func.substr(Task.description, 1, 51)))
+    .where(Task.user_id == bindparam('uid'), Task.status == bindparam('status'))
+    .order_by(Task.created_at.desc())
+)
+
 
 @task_bp.route('/')
 @login_required
@@ -15,20 +40,14 @@ def view_task():
     user_id = session.get('user_id')
     
     # Get only the current user's tasks
-    tasks = Task.query.filter_by(user_id=user_id).order_by(Task.created_at.desc()).all()
+    tasks = db.session.execute(_tasks_by_user, {'uid': user_id}).scalars().all()
     
-    # Calculate task statistics
-    total_tasks = len(tasks)
-    pending_tasks = sum(1 for task in tasks if task.status == 'Pending')
-    working_tasks = sum(1 for task in tasks if task.status == 'Working')
-    completed_tasks = sum(1 for task in tasks if task.status == 'Done')
+    # Task statistics (cached in Redis)
+    stats = get_stats(user_id)
     
     return render_template('tasks.html', 
                          tasks=tasks,
-                         total_tasks=total_tasks,
-                         pending_tasks=pending_tasks,
-                         working_tasks=working_tasks,
-                         completed_tasks=completed_tasks)
+                         **stats)
 
 
 @task_bp.route('/add', methods=['POST'])
@@ -61,6 +80,7 @@ def add_task():
         
         db.session.add(new_task)
         db.session.commit()
+        invalidate_stats(user_id)
         flash('Task added successfully!', 'success')
         
     except Exception as e:
@@ -71,6 +91,60 @@ def add_task():
     return redirect(url_for('tasks.view_task'))
 
 
+@task_bp.route('/import', methods=['POST'])
+@login_required
+def import_tasks():
+    """
+    Bulk import tasks for the current user from an uploaded CSV file
+    with a 'title' column and optional 'description' and 'status' columns.
+    """
+    user_id = session.get('user_id')
+    upload = request.files.get('file')
+    
+    if not upload or not upload.filename:
+        flash('Please choose a CSV file to import', 'danger')
+        return redirect(url_for('tasks.view_task'))
+    
+    try:
+        # Decode while reading instead of loading the whole file first
+        reader = csv.DictReader(io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline=''))
+        rows = []
+        for row in reader:
+            if len(rows) >= MAX_IMPORT_ROWS:
+                flash(f'Files can contain at most {MAX_IMPORT_ROWS} tasks; nothing was imported', 'danger')
+                return redirect(url_for('tasks.view_task'))
+            
+            title = (row.get('title') or '').strip()
+            status = (row.get('status') or 'Pending').strip()
+            
+            # Validation
+            if not title or len(title) > 200 or status not in ('Pending', 'Working', 'Done'):
+                flash(f'Invalid task on line {reader.line_num}; nothing was imported', 'danger')
+                return redirect(url_for('tasks.view_task'))
+            
+            rows.append({
+                'title': title,
+                'description': (row.get('description') or '').strip(),
+                'status': status,
+            })
+        
+        if not rows:
+            flash('No tasks found in the file', 'info')
+            return redirect(url_for('tasks.view_task'))
+        
+        task_count = Task.bulk_create(user_id, rows)
+        db.session.commit()
+        invalidate_stats(user_id)
+        flash(f'{task_count} task(s) imported successfully!', 'success')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash('Error importing tasks. Please check the file and try again.', 'danger')
+        print(f"Import tasks error: {str(e)}")
+    
+    return redirect(url_for('tasks.view_task'))
+
+
 @task_bp.route('/edit/<int:task_id>', methods=['GET', 'POST'])
 @login_required
 def edit_task(task_id):
@@ -78,7 +152,7 @@ def edit_task(task_id):
     Edit an existing task (only if it belongs to the current user).
     """
     user_id = session.get('user_id')
-    task = Task.query.filter_by(id=task_id, user_id=user_id).first()
+    task = db.session.execute(_task_by_id_user, {'tid': task_id, 'uid': user_id}).scalar_one_or_none()
     
     if not task:
         flash('Task not found or you do not have permission to edit it', 'danger')
@@ -121,7 +195,7 @@ def toggle_status(task_id):
     Only allows users to toggle their own tasks.
     """
     user_id = session.get('user_id')
-    task = Task.query.filter_by(id=task_id, user_id=user_id).first()
+    task = db.session.execute(_task_by_id_user, {'tid': task_id, 'uid': user_id}).scalar_one_or_none()
     
     if not task:
         flash('Task not found or you do not have permission to modify it', 'danger')
@@ -140,6 +214,7 @@ def toggle_status(task_id):
             flash(f'Task "{task.title}" reopened', 'info')
         
         db.session.commit()
+        invalidate_stats(user_id)
         
     except Exception as e:
         db.session.rollback()
@@ -156,7 +231,7 @@ def delete_task(task_id):
     Delete a specific task (only if it belongs to the current user).
     """
     user_id = session.get('user_id')
-    task = Task.query.filter_by(id=task_id, user_id=user_id).first()
+    task = db.session.execute(_task_by_id_user, {'tid': task_id, 'uid': user_id}).scalar_one_or_none()
     
     if not task:
         flash('Task not found or you do not have permission to delete it', 'danger')
@@ -166,6 +241,7 @@ def delete_task(task_id):
         task_title = task.title
         db.session.delete(task)
         db.session.commit()
+        invalidate_stats(user_id)
         flash(f'Task "{task_title}" deleted successfully', 'success')
         
     except Exception as e:
@@ -185,16 +261,16 @@ def clear_tasks():
     user_id = session.get('user_id')
     
     try:
-        # Delete only the current user's tasks
-        tasks_to_delete = Task.query.filter_by(user_id=user_id).all()
-        task_count = len(tasks_to_delete)
+        # Delete only the current user's tasks; delete() returns the rowcount.
+        # synchronize_session=False skips replaying the delete on the identity map.
+        task_count = Task.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+        db.session.commit()
+        invalidate_stats(user_id)
         
         if task_count == 0:
             flash('No tasks to clear', 'info')
             return redirect(url_for('tasks.view_task'))
         
-        Task.query.filter_by(user_id=user_id).delete()
-        db.session.commit()
         flash(f'{task_count} task(s) cleared successfully!', 'success')
         
     except Exception as e:
@@ -214,16 +290,16 @@ def clear_completed():
     user_id = session.get('user_id')
     
     try:
-        # Delete only completed tasks for current user
-        completed_tasks = Task.query.filter_by(user_id=user_id, status='Done').all()
-        task_count = len(completed_tasks)
+        # Delete only completed tasks for current user; delete() returns the rowcount.
+        # synchronize_session=False skips replaying the delete on the identity map.
+        task_count = Task.query.filter_by(user_id=user_id, status='Done').delete(synchronize_session=False)
+        db.session.commit()
+        invalidate_stats(user_id)
         
         if task_count == 0:
             flash('No completed tasks to clear', 'info')
             return redirect(url_for('tasks.view_task'))
         
-        Task.query.filter_by(user_id=user_id, status='Done').delete()
-        db.session.commit()
         flash(f'{task_count} completed task(s) cleared!', 'success')
         
     except Exception as e:
@@ -249,21 +325,14 @@ def filter_tasks(status):
         return redirect(url_for('tasks.view_task'))
     
     if status == 'All':
-        tasks = Task.query.filter_by(user_id=user_id).order_by(Task.created_at.desc()).all()
+        tasks = db.session.execute(_tasks_by_user, {'uid': user_id}).scalars().all()
     else:
-        tasks = Task.query.filter_by(user_id=user_id, status=status).order_by(Task.created_at.desc()).all()
+        tasks = db.session.execute(_tasks_by_user_status, {'uid': user_id, 'status': status}).scalars().all()
     
-    # Calculate task statistics
-    all_tasks = Task.query.filter_by(user_id=user_id).all()
-    total_tasks = len(all_tasks)
-    pending_tasks = sum(1 for task in all_tasks if task.status == 'Pending')
-    working_tasks = sum(1 for task in all_tasks if task.status == 'Working')
-    completed_tasks = sum(1 for task in all_tasks if task.status == 'Done')
+    # Task statistics (cached in Redis)
+    stats = get_stats(user_id)
     
     return render_template('tasks.html', 
                          tasks=tasks,
-                         total_tasks=total_tasks,
-                         pending_tasks=pending_tasks,
-                         working_tasks=working_tasks,
-                         completed_tasks=completed_tasks,
-                         current_filter=status)
+                         current_filter=status,
+                         **stats)
@@ -0,0 +1,90 @@
+from flask import current_app
+from sqlalchemy import select, func
+import redis
+from app import db
+from app.models import Task
+
+
+STATS_TTL = 300  # Cached statistics expire after 5 minutes
+
+
+def _redis():
+    """Return the Redis client configured for this app."""
+    return current_app.config['SESSION_REDIS']
+
+
+def _key(user_id):
+    return f'stats:{user_id}'
+
+
+def _version_key(user_id):
+    # Bumped by every invalidation; matches stats:* so clear_all_stats drops it too
+    return f'stats:{user_id}:version'
+
+
+def _status_counts(user_id):
+    """
+    Count the user's tasks per status with a single GROUP BY query.
+    Uses its own connection so the counts come from a fresh snapshot rather
+    than the request's transaction, which may predate another request's commit.
+    """
+    stmt = select(Task.status, func.count()).where(Task.user_id == user_id).group_by(Task.status)
+    with db.engine.connect() as conn:
+        return dict(conn.execute(stmt).all())
+
+
+def get_stats(user_id):
+    """
+    Get task statistics for a user, served from Redis when cached.
+    """
+    client = _redis()
+    cached = client.hgetall(_key(user_id))
+    if cached:
+        return {key.decode(): int(value) for key, value in cached.items()}
+    
+    # Read the version before counting so an invalidation in between is detected
+    version = client.get(_version_key(user_id))
+    counts = _status_counts(user_id)
+    stats = {
+        'total_tasks': sum(counts.values()),
+        'pending_tasks': counts.get('Pending', 0),
+        'working_tasks': counts.get('Working', 0),
+        'completed_tasks': counts.get('Done', 0),
+    }
+    
+    # Only cache the counts if no invalidation happened while they were computed
+    with client.pipeline() as pipe:
+        try:
+            pipe.watch(_version_key(user_id))
+            if pipe.get(_version_key(user_id)) == version:
+                pipe.multi()
+                pipe.hset(_key(user_id), mapping=stats)
+                pipe.expire(_key(user_id), STATS_TTL)
+                pipe.execute()
+        except redis.WatchError:
+            pass
+    return stats
+
+
+def invalidate_stats(user_id):
+    """
+    Drop cached statistics after the user's tasks change.
+    Called after the write has committed, so a Redis failure is only logged:
+    the change is saved and the cached stats expire within STATS_TTL.
+    """
+    try:
+        pipe = _redis().pipeline()
+        pipe.incr(_version_key(user_id))
+        pipe.delete(_key(user_id))
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"Invalidate stats error: {str(e)}")
+
+
+def clear_all_stats():
+    """Drop every user's cached statistics (e.g. after dropping the tables)."""
+    client = _redis()
+    keys = list(client.scan_iter(match=_key('*'), count=500))
+    # Delete in batches to keep each command small
+    for start in range(0, len(keys), 500):
+        client.delete(*keys[start:start + 500])
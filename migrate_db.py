@@ -2,9 +2,27 @@
 Database Migration Script for Todo Flask App
 """
 
+from sqlalchemy import create_engine, event
 from app import create_app, db
-from app.models import User, Task
-from datetime import datetime
+
+
+def _transactional_engine():
+    """
+    Engine whose transactions also cover DDL. pysqlite doesn't emit BEGIN
+    before ALTER TABLE, so SQLAlchemy's recipe takes over transaction control.
+    """
+    engine = create_engine(db.engine.url)
+    
+    @event.listens_for(engine, 'connect')
+    def disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+    
+    @event.listens_for(engine, 'begin')
+    def emit_begin(conn):
+        conn.exec_driver_sql('BEGIN')
+    
+    return engine
+
 
 def migrate_database():
     """Migrate the database schema to add new columns."""
@@ -14,52 +32,62 @@ def migrate_database():
         print("Starting database migration...")
         
         try:
-            # Try to inspect existing columns
-            from sqlalchemy import inspect
-            inspector = inspect(db.engine)
-            
-            # Check Task table columns
-            task_columns = [col['name'] for col in inspector.get_columns('task')]
-            print(f"Current Task columns: {task_columns}")
-            
-            # Add missing columns
+            # Fresh or empty database: create missing tables from the models
             with db.engine.connect() as conn:
+                tables = {row.name for row in conn.execute(db.text("SELECT name FROM sqlite_master WHERE type = 'table'"))}
+            if not {'task', 'user'} <= tables:
+                print("Creating missing tables...")
+                db.create_all()
+            
+            # Apply all schema changes in one transaction (single commit)
+            engine = _transactional_engine()
+            with engine.begin() as conn:
+                # Read existing columns straight from SQLite
+                task_columns = {row.name for row in conn.execute(db.text("PRAGMA table_info('task')"))}
+                print(f"Current Task columns: {sorted(task_columns)}")
+                user_columns = {row.name for row in conn.execute(db.text("PRAGMA table_info('user')"))}
+                print(f"Current User columns: {sorted(user_columns)}")
+                
                 if 'description' not in task_columns:
                     print("Adding 'description' column...")
                     conn.execute(db.text('ALTER TABLE task ADD COLUMN description TEXT'))
-                    conn.commit()
                 
+                # SQLite can't ADD COLUMN with a CURRENT_TIMESTAMP default,
+                # so existing rows are backfilled below; new rows get ORM defaults
                 if 'created_at' not in task_columns:
                     print("Adding 'created_at' column...")
-                    conn.execute(db.text(f"ALTER TABLE task ADD COLUMN created_at DATETIME DEFAULT '{datetime.utcnow()}'"))
-                    conn.commit()
+                    conn.execute(db.text('ALTER TABLE task ADD COLUMN created_at DATETIME'))
                 
                 if 'updated_at' not in task_columns:
                     print("Adding 'updated_at' column...")
-                    conn.execute(db.text(f"ALTER TABLE task ADD COLUMN updated_at DATETIME DEFAULT '{datetime.utcnow()}'"))
-                    conn.commit()
+                    conn.execute(db.text('ALTER TABLE task ADD COLUMN updated_at DATETIME'))
                 
                 if 'user_id' not in task_columns:
                     print("Adding 'user_id' column...")
                     conn.execute(db.text('ALTER TABLE task ADD COLUMN user_id INTEGER'))
-                    conn.commit()
-                    
-                    # Assign existing tasks to first user
-                    first_user = User.query.first()
-                    if first_user:
-                        print(f"Assigning tasks to user: {first_user.username}")
-                        conn.execute(db.text(f'UPDATE task SET user_id = {first_user.id} WHERE user_id IS NULL'))
-                        conn.commit()
-            
-            # Check User table
-            user_columns = [col['name'] for col in inspector.get_columns('user')]
-            print(f"Current User columns: {user_columns}")
-            
-            with db.engine.connect() as conn:
+                
+                # Composite indexes for per-user task listings
+                print("Creating task listing indexes...")
+                conn.execute(db.text('CREATE INDEX IF NOT EXISTS ix_task_user_status_created ON task (user_id, status, created_at)'))
+                conn.execute(db.text('CREATE INDEX IF NOT EXISTS ix_task_user_created ON task (user_id, created_at)'))
+                conn.execute(db.text('DROP INDEX IF EXISTS ix_task_user_id'))
+                
                 if 'created_at' not in user_columns:
                     print("Adding 'created_at' column to User table...")
-                    conn.execute(db.text(f"ALTER TABLE user ADD COLUMN created_at DATETIME DEFAULT '{datetime.utcnow()}'"))
-                    conn.commit()
+                    conn.execute(db.text('ALTER TABLE user ADD COLUMN created_at DATETIME'))
+                
+                # Backfill on every run so rows missed by an earlier run are repaired
+                conn.execute(db.text('UPDATE task SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL'))
+                conn.execute(db.text('UPDATE task SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL'))
+                conn.execute(db.text('UPDATE user SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL'))
+                
+                # Assign orphaned tasks to first user
+                first_user = conn.execute(db.text('SELECT id, username FROM user ORDER BY id LIMIT 1')).first()
+                if first_user:
+                    result = conn.execute(db.text('UPDATE task SET user_id = :uid WHERE user_id IS NULL'), {'uid': first_user.id})
+                    if result.rowcount:
+                        print(f"Assigned {result.rowcount} task(s) to user: {first_user.username}")
+            engine.dispose()
             
             print("\n✅ Migration completed successfully!")
             
@@ -83,6 +111,10 @@ def fresh_database():
             print("Creating new tables...")
             db.create_all()
             
+            # User ids restart at 1, so cached stats would belong to old users
+            from app.stats_cache import clear_all_stats
+            clear_all_stats()
+            
             print("✅ Fresh database created successfully!")
         else:
             print("❌ Operation cancelled.")
@@ -1,170 +1,307 @@
-from app import create_app, db
-from app.models import Task, User
+import os
+import sys
+import click
+from functools import cache
 
-app = create_app()
 
-# Create database tables if they don't exist
-with app.app_context():
-    db.create_all()
-    print("✅ Database tables created/verified successfully!")
+# Cheap scrypt cost (N=1024 instead of 32768) for dev-only seed/test users.
+# Registration uses Argon2, and these hashes are upgraded on first login.
+DEV_HASH_METHOD = 'scrypt:1024:8:1'
 
 
-# Optional: Flask CLI commands for database management
-@app.cli.command()
+def _dev_password_hash(password):
+    """Hash a dev-only password; werkzeug is imported on first use."""
+    from werkzeug.security import generate_password_hash
+    return generate_password_hash(password, method=DEV_HASH_METHOD)
+
+
+# Management commands live on a plain Click group so that importing this
+# module (or running `--help`) doesn't load Flask, SQLAlchemy or the app.
+@click.group(invoke_without_command=True)
+@click.pass_context
+def cli(ctx):
+    """Todo Flask App: runs the dev server, or a management command."""
+    if ctx.invoked_subcommand is None:
+        run_server()
+
+
+@cache
+def _app():
+    """Build the Flask app once, on first use (imports happen only here)."""
+    from app import create_app, db
+    from app.models import Task, User
+    
+    app = create_app()
+    
+    # Shell context for easier debugging
+    @app.shell_context_processor
+    def make_shell_context():
+        """Make database objects available in Flask shell."""
+        return {
+            'db': db,
+            'User': User,
+            'Task': Task
+        }
+    
+    # Keep the commands available through `flask --app run ...`
+    for command in cli.commands.values():
+        app.cli.add_command(command)
+    
+    return app
+
+
+def __getattr__(name):
+    """Create `app` on first access (`gunicorn run:app`, `flask --app run`)."""
+    if name == 'app':
+        return _app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Rows buffered per stdout write in the list commands (matches yield_per)
+OUTPUT_BATCH = 500
+
+
+def _write_lines(lines):
+    """Write buffered output lines with a single stdout write and empty the buffer."""
+    sys.stdout.write("\n".join(lines) + "\n")
+    lines.clear()
+
+
+# Optional: CLI commands for database management
+@cli.command()
 def init_db():
     """Initialize the database."""
-    db.create_all()
-    print("✅ Database initialized!")
+    from app import db
+    
+    with _app().app_context():
+        db.create_all()
+        print("✅ Database initialized!")
 
 
-@app.cli.command()
-def drop_db():
+@cli.command()
+@click.option('--yes', is_flag=True, help='Skip confirmation')
+def drop_db(yes):
     """Drop all database tables."""
-    if input("Are you sure you want to drop all tables? (yes/no): ").lower() == 'yes':
+    if not yes and not click.confirm("Are you sure you want to drop all tables?"):
+        print("❌ Operation cancelled.")
+        return
+    
+    from app import db
+    from app.stats_cache import clear_all_stats
+    
+    with _app().app_context():
         db.drop_all()
+        clear_all_stats()
         print("✅ All tables dropped!")
-    else:
-        print("❌ Operation cancelled.")
 
 
-@app.cli.command()
-def reset_db():
+@cli.command()
+@click.option('--yes', is_flag=True, help='Skip confirmation')
+def reset_db(yes):
     """Drop and recreate all database tables."""
-    if input("Are you sure you want to reset the database? (yes/no): ").lower() == 'yes':
+    if not yes and not click.confirm("Are you sure you want to reset the database?"):
+        print("❌ Operation cancelled.")
+        return
+    
+    from app import db
+    from app.stats_cache import clear_all_stats
+    
+    with _app().app_context():
         db.drop_all()
         db.create_all()
+        # User ids restart at 1, so cached stats would belong to old users
+        clear_all_stats()
         print("✅ Database reset successfully!")
-    else:
-        print("❌ Operation cancelled.")
 
 
-@app.cli.command()
+@cli.command()
 def create_test_user():
     """Create a test user for development."""
-    from werkzeug.security import generate_password_hash
+    from app import db
+    from app.models import User
     
     username = input("Enter username (default: testuser): ") or "testuser"
     password = input("Enter password (default: password123): ") or "password123"
     
-    existing_user = User.query.filter_by(username=username).first()
-    if existing_user:
-        print(f"❌ User '{username}' already exists!")
-        return
-    
-    user = User(
-        username=username,
-        password=generate_password_hash(password, method='scrypt')
-    )
-    db.session.add(user)
-    db.session.commit()
+    with _app().app_context():
+        existing_user = User.query.filter_by(username=username).first()
+        if existing_user:
+            print(f"❌ User '{username}' already exists!")
+            return
+        
+        user = User(
+            username=username,
+            password=_dev_password_hash(password)
+        )
+        db.session.add(user)
+        db.session.commit()
     
     print(f"✅ Test user created!")
     print(f"   Username: {username}")
     print(f"   Password: {password}")
 
 
-@app.cli.command()
+@cli.command()
 def list_users():
     """List all users in the database."""
-    users = User.query.all()
-    if not users:
-        print("No users found in database.")
-        return
+    from sqlalchemy import select, func
+    from app import db
+    from app.models import Task, User
     
-    print(f"\n{'ID':<5} {'Username':<20} {'Tasks':<10} {'Created At'}")
-    print("-" * 60)
-    for user in users:
-        task_count = len(user.tasks)
-        created = user.created_at.strftime('%Y-%m-%d %H:%M') if hasattr(user, 'created_at') and user.created_at else 'N/A'
-        print(f"{user.id:<5} {user.username:<20} {task_count:<10} {created}")
+    with _app().app_context():
+        # Users with their task counts in one GROUP BY query, streamed in chunks
+        stmt = select(User, func.count(Task.id).label('n')) \
+            .outerjoin(Task, Task.user_id == User.id) \
+            .group_by(User.id) \
+            .execution_options(yield_per=500)
+        
+        has_created = hasattr(User, 'created_at')
+        found = False
+        lines = []
+        for user, task_count in db.session.execute(stmt):
+            if not found:
+                lines.append(f"\n{'ID':<5} {'Username':<20} {'Tasks':<10} {'Created At'}")
+                lines.append("-" * 60)
+                found = True
+            created = user.created_at.strftime('%Y-%m-%d %H:%M') if has_created and user.created_at else 'N/A'
+            lines.append(f"{user.id:<5} {user.username:<20} {task_count:<10} {created}")
+            if len(lines) >= OUTPUT_BATCH:
+                _write_lines(lines)
+        
+        if lines:
+            _write_lines(lines)
+        if not found:
+            print("No users found in database.")
 
 
-@app.cli.command()
+@cli.command()
 def list_tasks():
     """List all tasks in the database."""
-    tasks = Task.query.all()
-    if not tasks:
-        print("No tasks found in database.")
-        return
+    from sqlalchemy import select
+    from sqlalchemy.orm import joinedload
+    from app import db
+    from app.models import Task
     
-    print(f"\n{'ID':<5} {'Title':<30} {'Status':<12} {'User':<15}")
-    print("-" * 70)
-    for task in tasks:
-        title = task.title[:27] + '...' if len(task.title) > 30 else task.title
-        username = task.user.username if hasattr(task, 'user') and task.user else 'N/A'
-        print(f"{task.id:<5} {title:<30} {task.status:<12} {username:<15}")
+    with _app().app_context():
+        # Stream tasks in chunks instead of loading the whole table
+        stmt = select(Task).options(joinedload(Task.user)).execution_options(yield_per=500)
+        
+        found = False
+        lines = []
+        for task in db.session.execute(stmt).scalars():
+            if not found:
+                lines.append(f"\n{'ID':<5} {'Title':<30} {'Status':<12} {'User':<15}")
+                lines.append("-" * 70)
+                found = True
+            title = task.title
+            if title[30:]:
+                title = title[:27] + '...'
+            username = task.user.username if task.user else 'N/A'
+            lines.append(f"{task.id:<5} {title:<30} {task.status:<12} {username:<15}")
+            if len(lines) >= OUTPUT_BATCH:
+                _write_lines(lines)
+        
+        if lines:
+            _write_lines(lines)
+        if not found:
+            print("No tasks found in database.")
 
 
-@app.cli.command()
-def seed_db():
+@cli.command()
+@click.option('--bulk', is_flag=True, help='Insert tasks with a Core executemany (for large fixture loads)')
+def seed_db(bulk):
     """Seed the database with sample data."""
-    from werkzeug.security import generate_password_hash
-    from datetime import datetime, timedelta
-    
-    print("Seeding database with sample data...")
-    
-    # Create test users
-    users_data = [
-        {'username': 'john', 'password': 'password123'},
-        {'username': 'jane', 'password': 'password123'},
-    ]
-    
-    users = []
-    for user_data in users_data:
-        existing = User.query.filter_by(username=user_data['username']).first()
-        if not existing:
-            user = User(
-                username=user_data['username'],
-                password=generate_password_hash(user_data['password'], method='scrypt')
-            )
-            db.session.add(user)
-            users.append(user)
-            print(f"   ✓ Created user: {user_data['username']}")
+    from itertools import cycle
+    from app import db
+    from app.models import Task, User
+    from app.stats_cache import invalidate_stats
+    
+    with _app().app_context():
+        print("Seeding database with sample data...")
+        
+        # Create test users
+        users_data = [
+            {'username': 'john', 'password': 'password123'},
+            {'username': 'jane', 'password': 'password123'},
+        ]
+        
+        # Hash each distinct password once, not once per user
+        password_hashes = {
+            password: _dev_password_hash(password)
+            for password in {user_data['password'] for user_data in users_data}
+        }
+        
+        # Look up all existing seed users in one query
+        names = [user_data['username'] for user_data in users_data]
+        existing_users = {user.username: user for user in User.query.filter(User.username.in_(names)).all()}
+        
+        users = []
+        new_users = []
+        for user_data in users_data:
+            existing = existing_users.get(user_data['username'])
+            if not existing:
+                user = {
+                    'username': user_data['username'],
+                    'password': password_hashes[user_data['password']]
+                }
+                new_users.append(user)
+                users.append(user)
+                print(f"   ✓ Created user: {user_data['username']}")
+            else:
+                users.append({'id': existing.id, 'username': existing.username})
+                print(f"   - User already exists: {user_data['username']}")
+        
+        # One executemany; return_defaults fills in each new user's id.
+        # Users and tasks are committed together in a single transaction.
+        db.session.bulk_insert_mappings(User, new_users, return_defaults=True)
+        
+        # Create sample tasks
+        sample_tasks = [
+            {'title': 'Complete project documentation', 'description': 'Write comprehensive docs', 'status': 'Working'},
+            {'title': 'Review pull requests', 'description': 'Check team PRs', 'status': 'Pending'},
+            {'title': 'Setup CI/CD pipeline', 'description': 'Configure GitHub Actions', 'status': 'Done'},
+            {'title': 'Update dependencies', 'description': 'Update npm packages', 'status': 'Pending'},
+            {'title': 'Fix bug in login', 'description': 'Session timeout issue', 'status': 'Working'},
+        ]
+        
+        # Assign tasks to users round-robin
+        task_rows = []
+        for task_data, user in zip(sample_tasks, cycle(users)):
+            task_rows.append({
+                'title': task_data['title'],
+                'description': task_data.get('description'),
+                'status': task_data['status'],
+                'user_id': user['id']
+            })
+            print(f"   ✓ Created task: {task_data['title']} (for {user['username']})")
+        
+        if bulk:
+            # Core INSERT skips the ORM entirely; runs on the session's
+            # connection so users and tasks still share one transaction
+            db.session.execute(Task.__table__.insert(), task_rows)
         else:
-            users.append(existing)
-            print(f"   - User already exists: {user_data['username']}")
-    
-    db.session.commit()
-    
-    # Create sample tasks
-    sample_tasks = [
-        {'title': 'Complete project documentation', 'description': 'Write comprehensive docs', 'status': 'Working'},
-        {'title': 'Review pull requests', 'description': 'Check team PRs', 'status': 'Pending'},
-        {'title': 'Setup CI/CD pipeline', 'description': 'Configure GitHub Actions', 'status': 'Done'},
-        {'title': 'Update dependencies', 'description': 'Update npm packages', 'status': 'Pending'},
-        {'title': 'Fix bug in login', 'description': 'Session timeout issue', 'status': 'Working'},
-    ]
-    
-    for i, task_data in enumerate(sample_tasks):
-        user = users[i % len(users)]
-        task = Task(
-            title=task_data['title'],
-            description=task_data.get('description'),
-            status=task_data['status'],
-            user_id=user.id
-        )
-        db.session.add(task)
-        print(f"   ✓ Created task: {task_data['title']} (for {user.username})")
+            db.session.bulk_insert_mappings(Task, task_rows)
+        db.session.commit()
+        
+        for user_id in {row['user_id'] for row in task_rows}:
+            invalidate_stats(user_id)
     
-    db.session.commit()
     print("\n✅ Database seeded successfully!")
     print("\nTest credentials:")
     print("   Username: john / Password: password123")
     print("   Username: jane / Password: password123")
 
 
-# Shell context for easier debugging
-@app.shell_context_processor
-def make_shell_context():
-    """Make database objects available in Flask shell."""
-    return {
-        'db': db,
-        'User': User,
-        'Task': Task
-    }
-
-
-if __name__ == '__main__':
+def run_server():
+    """
+    Start the development server.
+    For production use a WSGI server instead, e.g. `gunicorn -w 4 -k gthread run:app`.
+    """
+    if os.getenv("FLASK_ENV") == "production":
+        raise SystemExit("Use gunicorn/uvicorn in production; do not run run.py directly.")
+    
+    app = _app()
+    
     print("=" * 60)
     print("🚀 Starting Flask Todo App")
     print("=" * 60)
@@ -172,6 +309,13 @@ if __name__ == '__main__':
     print(f"📍 Login page: http://127.0.0.1:5000/auth/login")
     print(f"📍 Register page: http://127.0.0.1:5000/auth/register")
     print("=" * 60)
-    print("\n💡 Tip: Press CTRL+C to stop the server\n")
+    print("\n💡 New install? Run `python run.py init-db` once to create the tables.")
+    print("💡 Tip: Press CTRL+C to stop the server\n")
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Debug mode (and its re-importing reloader) is opt-in via FLASK_DEBUG=1
+    debug = os.getenv("FLASK_DEBUG", "0") == "1"
+    app.run(debug=debug, use_reloader=debug, host='0.0.0.0', port=5000)
+
+
+if __name__ == '__main__':
+    cli()